@@ -1,5 +1,5 @@
 import sys
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, List, Optional, Union
 
 import keras_core as keras
 import wandb
@@ -20,7 +20,6 @@ elif keras.backend.backend() == "torch":
     torch_backend_available = True
 elif keras.backend.backend() == "jax":
     import jax
-    import numpy as np
 
     jax_backend_available = True
 
@@ -33,6 +32,28 @@ else:
 LogStrategy = Literal["epoch", "batch"]
 
 
+def _get_lr_keras(optimizer: keras.optimizers.Optimizer) -> float:
+    return float(optimizer.learning_rate.numpy())
+
+
+def _get_lr_tf(optimizer: keras.optimizers.Optimizer) -> float:
+    if isinstance(optimizer.learning_rate, tf.Tensor):
+        return float(optimizer.learning_rate.numpy())
+    return _get_lr_keras(optimizer)
+
+
+def _get_lr_torch(optimizer: keras.optimizers.Optimizer) -> float:
+    if isinstance(optimizer.learning_rate, torch.Tensor):
+        return float(optimizer.learning_rate.item())
+    return _get_lr_keras(optimizer)
+
+
+def _get_lr_jax(optimizer: keras.optimizers.Optimizer) -> float:
+    if isinstance(optimizer.learning_rate, jax.Array):
+        return float(jax.device_get(optimizer.learning_rate))
+    return _get_lr_keras(optimizer)
+
+
 class WandbMetricsLogger(Callback):
     """Logger that sends system metrics to W&B.
 
@@ -52,6 +73,17 @@ class WandbMetricsLogger(Callback):
         calculated as the product of the cardinality of the training dataset and the
         batch size.
 
+    !!! tip "System metrics sampling"
+        W&B samples system metrics in the background while training runs. When
+        logging batch-wise on small models, this sampling can compete with the
+        training loop. The sampling rate is read when the run starts, so it cannot
+        be changed by this callback. You can coarsen it in `wandb.init`, at the cost
+        of coarser system telemetry:
+
+        ```python
+        wandb.init(settings=wandb.Settings(_stats_sample_rate_seconds=10))
+        ```
+
     !!! example "Example notebooks:"
         - [Image Classification using Keras Core](../examples/image_classification).
 
@@ -64,12 +96,16 @@ class WandbMetricsLogger(Callback):
             learning rate when you resume training from some `initial_epoch`,
             and a learning rate scheduler is used. This can be computed as
             `step_size * initial_step`. Defaults to 0.
+        flush_every (int): number of logged batches to accumulate in a local buffer
+            before sending them to W&B when logging batch-wise. The buffer is also
+            drained at the end of each epoch and at the end of training. Defaults to 1.
     """
 
     def __init__(
         self,
         log_freq: Union[LogStrategy, int] = "epoch",
         initial_global_step: int = 0,
+        flush_every: int = 1,
         *args: Any,
         **kwargs: Any,
     ) -> None:
@@ -90,6 +126,18 @@ class WandbMetricsLogger(Callback):
         self.log_freq: Any = log_freq if self.logging_batch_wise else None
         self.global_batch = 0
         self.global_step = initial_global_step
+        self._buffer: List[Dict[str, Any]] = []
+        self._flush_every = max(int(flush_every), 1)
+        # the active backend is fixed at import time, so the matching learning
+        # rate reader is bound once instead of being resolved on every call.
+        if tf_backend_available:
+            self._lr_fn = _get_lr_tf
+        elif torch_backend_available:
+            self._lr_fn = _get_lr_torch
+        elif jax_backend_available:
+            self._lr_fn = _get_lr_jax
+        else:
+            self._lr_fn = _get_lr_keras
 
         if self.logging_batch_wise:
             # define custom x-axis for batch logging.
@@ -103,32 +151,30 @@ class WandbMetricsLogger(Callback):
             wandb.define_metric("epoch/*", step_metric="epoch/epoch")
 
     def _get_lr(self) -> Union[float, None]:
+        if self._lr_fn is None:
+            return None
         try:
-            if isinstance(self.model.optimizer, keras.optimizers.Optimizer):
-                return float(self.model.optimizer.learning_rate.numpy().item())
+            return self._lr_fn(self.model.optimizer)
         except Exception:
-            if tf_backend_available:
-                if isinstance(self.model.optimizer.learning_rate, tf.Tensor):
-                    return float(self.model.optimizer.learning_rate.numpy().item())
-                else:
-                    wandb.termerror("Unable to log learning rate.", repeat=False)
-                    return None
-            elif torch_backend_available:
-                if isinstance(self.model.optimizer.learning_rate, torch.Tensor):
-                    lr = self.model.optimizer.learning_rate.to("cpu")
-                    return float(lr.numpy().item())
-                else:
-                    wandb.termerror("Unable to log learning rate.", repeat=False)
-                    return None
-            elif jax_backend_available:
-                try:
-                    return float(np.array(self.model.optimizer.learning_rate).item())
-                except Exception as e:
-                    wandb.termerror("Unable to log learning rate.", repeat=False)
-                    return None
+            wandb.termerror(
+                "Unable to log learning rate. Learning rate logging is disabled "
+                "for the rest of this run.",
+                repeat=False,
+            )
+            # stop retrying once the learning rate could not be read.
+            self._lr_fn = None
+            return None
+
+    def _flush(self) -> None:
+        for entry in self._buffer:
+            wandb.log(entry)
+        self._buffer = []
 
     def on_epoch_end(self, epoch: int, logs: Optional[Dict[str, Any]] = None) -> None:
-        logs = dict() if logs is None else {f"epoch/{k}": v for k, v in logs.items()}
+        self._flush()
+
+        prefix = "epoch/"
+        logs = dict() if logs is None else {prefix + k: v for k, v in logs.items()}
 
         logs["epoch/epoch"] = epoch
 
@@ -140,19 +186,27 @@ class WandbMetricsLogger(Callback):
 
     def on_batch_end(self, batch: int, logs: Optional[Dict[str, Any]] = None) -> None:
         self.global_step += 1
-        if self.logging_batch_wise and batch % self.log_freq == 0:
-            logs = {f"batch/{k}": v for k, v in logs.items()} if logs else {}
-            logs["batch/batch_step"] = self.global_batch
+        if not (self.logging_batch_wise and batch % self.log_freq == 0):
+            return
 
-            lr = self._get_lr()
-            if lr is not None:
-                logs["batch/learning_rate"] = lr
+        prefix = "batch/"
+        logs = {prefix + k: v for k, v in logs.items()} if logs else {}
+        logs["batch/batch_step"] = self.global_batch
 
-            wandb.log(logs)
+        lr = self._get_lr()
+        if lr is not None:
+            logs["batch/learning_rate"] = lr
 
-            self.global_batch += self.log_freq
+        self._buffer.append(logs)
+        if len(self._buffer) >= self._flush_every:
+            self._flush()
+
+        self.global_batch += self.log_freq
 
     def on_train_batch_end(
         self, batch: int, logs: Optional[Dict[str, Any]] = None
     ) -> None:
-        self.on_batch_end(batch, logs if logs else {})
+        self.on_batch_end(batch, logs)
+
+    def on_train_end(self, logs: Optional[Dict[str, Any]] = None) -> None:
+        self._flush()
@@ -1,5 +1,8 @@
-from typing import Dict, List, Optional, Tuple, Union
+from collections import defaultdict
+from typing import Dict, Optional, Tuple, Union
 
+import numpy as np
+import torch
 from ultralytics.yolo.engine.results import Results
 from ultralytics.yolo.utils import ops
 from ultralytics.yolo.v8.detect.predict import DetectionPredictor
@@ -7,13 +10,12 @@ from ultralytics.yolo.v8.detect.predict import DetectionPredictor
 import wandb
 
 
-def scale_bounding_box_to_original_image_shape(
-    box, resized_image_shape, original_image_shape, ratio_pad
-):
+def scale_bboxes_batch(bboxes, resized_image_shape, original_image_shape, ratio_pad):
     """
     YOLOv8 resizes images during training and the label values
-    are normalized based on this resized shape. This function rescales the
-    bounding box labels to the original image shape.
+    are normalized based on this resized shape. This function rescales all the
+    bounding box labels of an image, passed as a single `(N, 4)` tensor, to the
+    original image shape and returns them as an `(N, 4)` integer tensor.
 
     Reference: https://github.com/ultralytics/ultralytics/blob/main/ultralytics/yolo/utils/callbacks/comet.py#L105
     """
@@ -21,58 +23,66 @@ def scale_bounding_box_to_original_image_shape(
     resized_image_height, resized_image_width = resized_image_shape
 
     # Convert normalized xywh format predictions to xyxy in resized scale format
-    box = ops.xywhn2xyxy(box, h=resized_image_height, w=resized_image_width)
+    bboxes = ops.xywhn2xyxy(bboxes, h=resized_image_height, w=resized_image_width)
     # Scale box predictions from resized image scale back to original image scale
-    box = ops.scale_boxes(resized_image_shape, box, original_image_shape, ratio_pad)
+    bboxes = ops.scale_boxes(
+        resized_image_shape, bboxes, original_image_shape, ratio_pad
+    )
     # # Convert bounding box format from xyxy to xywh for Comet logging
-    box = ops.xyxy2xywh(box)
-    # # Adjust xy center to correspond top-left corner
-    # box[:2] -= box[2:] / 2
-    box = box.tolist()
-
-    return box
-
+    bboxes = ops.xyxy2xywh(bboxes)
+    # Truncate to integer pixel coordinates for the whole tensor at once
+    bboxes = bboxes.long()
 
-def get_ground_truth_annotations(img_idx, image_path, batch, class_name_map=None):
-    indices = batch["batch_idx"] == img_idx
-    bboxes = batch["bboxes"][indices]
-    cls_labels = batch["cls"][indices].squeeze(1).tolist()
+    return bboxes
 
-    class_name_map_reverse = {v: k for k, v in class_name_map.items()}
 
+def group_labels_by_image(batch):
+    """Sort the labels of a batch by image index and compute the boundaries of
+    each image's labels, so that they can be sliced per image without building a
+    boolean mask over the whole batch for every image.
+    """
+    sorted_batch_idx, order = torch.sort(batch["batch_idx"], stable=True)
+    image_indices = torch.arange(
+        len(batch["im_file"]) + 1, dtype=sorted_batch_idx.dtype
+    )
+    boundaries = torch.searchsorted(sorted_batch_idx, image_indices).tolist()
+    return batch["bboxes"][order], batch["cls"][order], boundaries
+
+
+def get_ground_truth_annotations(
+    image_path,
+    bboxes,
+    cls,
+    original_image_shape,
+    resized_image_shape,
+    ratio_pad,
+    class_name_map=None,
+    class_name_map_reverse=None,
+):
     if len(bboxes) == 0:
         wandb.termwarn(f"Image: {image_path} has no bounding boxes labels")
         return None
 
-    cls_labels = batch["cls"][indices].squeeze(1).tolist()
+    if class_name_map_reverse is None:
+        class_name_map_reverse = {v: k for k, v in class_name_map.items()}
+
+    cls_labels = cls.squeeze(1).tolist()
     if class_name_map:
         cls_labels = [str(class_name_map[label]) for label in cls_labels]
 
-    original_image_shape = batch["ori_shape"][img_idx]
-    resized_image_shape = batch["resized_shape"][img_idx]
-    ratio_pad = batch["ratio_pad"][img_idx]
+    scaled_bboxes = scale_bboxes_batch(
+        bboxes, resized_image_shape, original_image_shape, ratio_pad
+    ).tolist()
 
-    original_image_shape = batch["ori_shape"][img_idx]
-    resized_image_shape = batch["resized_shape"][img_idx]
-    ratio_pad = batch["ratio_pad"][img_idx]
-
-    data = []
-    for box, label in zip(bboxes, cls_labels):
-        box = scale_bounding_box_to_original_image_shape(
-            box, resized_image_shape, original_image_shape, ratio_pad
-        )
-        data.append(
-            {
-                "position": {
-                    "middle": [int(box[0]), int(box[1])],
-                    "width": int(box[2]),
-                    "height": int(box[3]),
-                },
-                "domain": "pixel",
-                "class_id": class_name_map_reverse[label],
-                "box_caption": label,
-            }
-        )
+    data = [
+        {
+            "position": {"middle": [x, y], "width": w, "height": h},
+            "domain": "pixel",
+            "class_id": class_name_map_reverse[label],
+            "box_caption": label,
+        }
+        for (x, y, w, h), label in zip(scaled_bboxes, cls_labels)
+    ]
 
     return data
 
@@ -81,65 +91,79 @@ def create_prediction_metadata_map(model_predictions):
     """Create metadata map for model predictions by groupings them based on
     image ID.
     """
-    pred_metadata_map = {}
+    pred_metadata_map = defaultdict(list)
     for prediction in model_predictions:
-        pred_metadata_map.setdefault(prediction["image_id"], [])
         pred_metadata_map[prediction["image_id"]].append(prediction)
 
-    return pred_metadata_map
+    return dict(pred_metadata_map)
 
 
 def get_mean_confidence_map(
-    classes: List, confidence: List, class_id_to_label: Dict
+    classes: np.ndarray, confidence: np.ndarray, class_id_to_label: Dict
 ) -> Dict:
-    confidence_map = {v: [] for _, v in class_id_to_label.items()}
-    for class_idx, confidence_value in zip(classes, confidence):
-        confidence_map[class_id_to_label[class_idx]].append(confidence_value)
-    for label, confidence_list in confidence_map.items():
-        if len(confidence_list) > 0:
-            confidence_map[label] = sum(confidence_list) / len(confidence_list)
-        else:
-            confidence_map[label] = 0
-    return confidence_map
+    classes = np.asarray(classes, dtype=np.int64)
+    minlength = max(class_id_to_label, default=-1) + 1
+    sums = np.bincount(classes, weights=confidence, minlength=minlength)
+    counts = np.bincount(classes, minlength=sums.shape[0])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = np.where(counts > 0, sums / counts, 0.0)
+    return {
+        label: float(means[class_idx]) for class_idx, label in class_id_to_label.items()
+    }
 
 
-def plot_predictions(
-    result: Results, table: Optional[wandb.Table] = None
-) -> Union[wandb.Table, Tuple[wandb.Image, Dict, Dict]]:
-    boxes = result.boxes.xywh.to("cpu").long().numpy()
-    classes = result.boxes.cls.to("cpu").long().numpy()
-    confidence = result.boxes.conf.to("cpu").numpy()
-    class_id_to_label = {int(k): str(v) for k, v in result.names.items()}
+def get_prediction_box_data(
+    result: Results, class_id_to_label: Optional[Dict[int, str]] = None
+) -> Tuple[Dict, Dict]:
+    # Concatenate on the device so that boxes, classes and confidences are
+    # transferred to the host in a single copy.
+    combined = torch.cat(
+        [
+            result.boxes.xywh,
+            result.boxes.cls.unsqueeze(1),
+            result.boxes.conf.unsqueeze(1),
+        ],
+        dim=1,
+    )
+    combined = combined.to("cpu").numpy()
+    boxes = combined[:, :4].astype(np.int64)
+    classes = combined[:, 4].astype(np.int64)
+    confidence = combined[:, 5]
+    if class_id_to_label is None:
+        class_id_to_label = {int(k): str(v) for k, v in result.names.items()}
     mean_confidence_map = get_mean_confidence_map(
         classes, confidence, class_id_to_label
     )
-    box_data, total_confidence = [], 0.0
-    for idx in range(len(boxes)):
-        box_data.append(
-            {
-                "position": {
-                    "middle": [int(boxes[idx][0]), int(boxes[idx][1])],
-                    "width": int(boxes[idx][2]),
-                    "height": int(boxes[idx][3]),
-                },
-                "domain": "pixel",
-                "class_id": int(classes[idx]),
-                "box_caption": class_id_to_label[int(classes[idx])],
-                "scores": {"confidence": float(confidence[idx])},
-            }
+    box_data = [
+        {
+            "position": {"middle": [x, y], "width": w, "height": h},
+            "domain": "pixel",
+            "class_id": class_idx,
+            "box_caption": class_id_to_label[class_idx],
+            "scores": {"confidence": confidence_value},
+        }
+        for (x, y, w, h), class_idx, confidence_value in zip(
+            boxes.tolist(), classes.tolist(), confidence.astype(float).tolist()
         )
-        total_confidence += float(confidence[idx])
-    boxes = {
-        "predictions": {
-            "box_data": box_data,
-            "class_labels": class_id_to_label,
-        },
-    }
+    ]
+    predictions = {"box_data": box_data, "class_labels": class_id_to_label}
+    return predictions, mean_confidence_map
+
+
+def plot_predictions(
+    result: Results,
+    table: Optional[wandb.Table] = None,
+    class_id_to_label: Optional[Dict[int, str]] = None,
+) -> Union[wandb.Table, Tuple[wandb.Image, Dict, Dict]]:
+    predictions, mean_confidence_map = get_prediction_box_data(
+        result, class_id_to_label
+    )
+    boxes = {"predictions": predictions}
     image = wandb.Image(result.orig_img[:, :, ::-1], boxes=boxes)
     if table is not None:
-        table.add_data(image, len(box_data), mean_confidence_map)
+        table.add_data(image, len(predictions["box_data"]), mean_confidence_map)
         return table
-    return image, boxes["predictions"], mean_confidence_map
+    return image, predictions, mean_confidence_map
 
 
 def plot_validation_results(
@@ -151,36 +175,49 @@ def plot_validation_results(
     epoch: Optional[int] = None,
 ) -> wandb.Table:
     data_idx = 0
+    class_label_map_reverse = {v: k for k, v in class_label_map.items()}
+    class_id_to_label = {int(k): str(v) for k, v in predictor.model.names.items()}
     for batch_idx, batch in enumerate(dataloader):
+        sorted_bboxes, sorted_cls, boundaries = group_labels_by_image(batch)
         for img_idx, image_path in enumerate(batch["im_file"]):
-            _, prediction_box_data, mean_confidence_map = plot_predictions(
-                predictor(image_path)[0]
+            start, end = boundaries[img_idx], boundaries[img_idx + 1]
+            ground_truth_data = get_ground_truth_annotations(
+                image_path,
+                sorted_bboxes[start:end],
+                sorted_cls[start:end],
+                batch["ori_shape"][img_idx],
+                batch["resized_shape"][img_idx],
+                batch["ratio_pad"][img_idx],
+                class_label_map,
+                class_label_map_reverse,
             )
-            try:
-                ground_truth_data = get_ground_truth_annotations(
-                    img_idx, image_path, batch, class_label_map
-                )
-                wandb_image = wandb.Image(
-                    image_path,
-                    boxes={
-                        "ground-truth": {
-                            "box_data": ground_truth_data,
-                            "class_labels": class_label_map,
-                        },
-                        "predictions": prediction_box_data,
+            if ground_truth_data is None:
+                continue
+            # Predict from the path so that the image is read with cv2, like the
+            # validation dataset does, and the boxes align with the ground-truth
+            prediction = predictor(image_path)[0]
+            # Only the box data is needed here, so the prediction image that
+            # `plot_predictions` would build and serialize is skipped
+            prediction_box_data, mean_confidence_map = get_prediction_box_data(
+                prediction, class_id_to_label
+            )
+            wandb_image = wandb.Image(
+                image_path,
+                boxes={
+                    "ground-truth": {
+                        "box_data": ground_truth_data,
+                        "class_labels": class_label_map,
                     },
+                    "predictions": prediction_box_data,
+                },
+            )
+            if epoch is None:
+                table.add_data(data_idx, batch_idx, wandb_image, mean_confidence_map)
+            else:
+                table.add_data(
+                    epoch, data_idx, batch_idx, wandb_image, mean_confidence_map
                 )
-                if epoch is None:
-                    table.add_data(
-                        data_idx, batch_idx, wandb_image, mean_confidence_map
-                    )
-                else:
-                    table.add_data(
-                        epoch, data_idx, batch_idx, wandb_image, mean_confidence_map
-                    )
-                data_idx += 1
-            except TypeError:
-                pass
+            data_idx += 1
         if batch_idx + 1 == max_validation_batches:
             break
     return table
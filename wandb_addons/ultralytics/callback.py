@@ -150,8 +150,11 @@ class WandBUltralyticsCallback:
         wandb.log({"Validation-Table": self.validation_table})
 
     def on_predict_end(self, predictor: DetectionPredictor):
+        class_id_to_label = {int(k): str(v) for k, v in predictor.model.names.items()}
         for result in tqdm(predictor.results):
-            self.prediction_table = plot_predictions(result, self.prediction_table)
+            self.prediction_table = plot_predictions(
+                result, self.prediction_table, class_id_to_label
+            )
         wandb.log({"Prediction-Table": self.prediction_table})
 
     @property